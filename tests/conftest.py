@@ -23,6 +23,22 @@ def inv(pytestconfig):
     return inv
 
 
+@pytest.fixture(scope='session')
+def inv_roles(inv):
+    # Map each object name to the role of its first entry in the inventory
+    roles = {}
+    for obj in inv.objects:
+        roles.setdefault(obj.name, obj.role)
+
+    return roles
+
+
+@pytest.fixture(scope='session', autouse=True)
+def add_test_path_to_sys_path():
+    # Add test directory to sys.path to allow imports of dummy module.
+    sys.path.insert(0, str(pathlib.Path(__file__).parent))
+
+
 @pytest.fixture(autouse=True)
 def remove_sphinx_projects(sphinx_test_tempdir):
     # Remove any directory which appears to be a Sphinx project from
@@ -37,6 +53,6 @@ def remove_sphinx_projects(sphinx_test_tempdir):
             pass
 
 
-@pytest.fixture
+@pytest.fixture(scope='session')
 def rootdir():
     return path(os.path.dirname(__file__) or '.').abspath() / 'roots'
@@ -1,12 +1,16 @@
+import difflib
 import pathlib
 import pytest
 import re
 import sys
 import textwrap
+from io import StringIO
 from typing import (
     Any, AnyStr, Callable, Dict, Generic, Mapping, NewType, Optional, Pattern,
     Tuple, TypeVar, Union, Type)
 
+from sphinx.testing.path import path
+from sphinx.testing.util import SphinxTestApp
 from typing_extensions import Protocol
 
 from sphinx_autodoc_typehints import format_annotation, process_docstring
@@ -26,6 +30,15 @@ U = TypeVar('U', covariant=True)
 V = TypeVar('V', contravariant=True)
 W = NewType('W', str)
 
+_ROLE_RE = re.compile(r'^:py:(?P<role>class|data|func):`~(?P<name>[^`]+)`')
+_DASH_TRANS = str.maketrans({'–': '--'})
+
+# Union erases the str from Union[str, Any] on Python 3.5.0 - 3.5.2
+_SKIP_UNION_ERASURE = (3, 5, 0) <= sys.version_info[:3] <= (3, 5, 2)
+
+# typing names missing from the Python 3.5 objects.inv
+_OBJINV_SPECIAL = frozenset({'typing.Pattern', 'typing.Match', 'typing.NoReturn'})
+
 
 class A:
     def get_type(self):
@@ -56,7 +69,26 @@ class Metaclass(type):
     pass
 
 
-@pytest.mark.parametrize('annotation, expected_result', [
+def _expand_cases(cases):
+    # Add the expected fully qualified result (None if it needs no separate check) and whether
+    # to check the role against objects.inv to each case
+    params = []
+    for case in cases:
+        values, marks = (case.values, case.marks) if hasattr(case, 'marks') else (case, ())
+        annotation, expected_result = values
+        fully_qualified_result = None
+        if 'typing' in expected_result or __name__ in expected_result:
+            fully_qualified_result = expected_result.replace('~typing', 'typing')
+            fully_qualified_result = fully_qualified_result.replace('~' + __name__, __name__)
+
+        check_role = 'typing' in expected_result
+        params.append(pytest.param(annotation, expected_result, fully_qualified_result,
+                                   check_role, marks=marks))
+
+    return tuple(params)
+
+
+_FMT_CASES = _expand_cases([
     (str,                           ':py:class:`str`'),
     (int,                           ':py:class:`int`'),
     (type(None),                    '``None``'),
@@ -93,7 +125,7 @@ class Metaclass(type):
                                     ':py:class:`bool`]'),
     pytest.param(Union[str, Any],   ':py:data:`~typing.Union`\\[:py:class:`str`, '
                                     ':py:data:`~typing.Any`]',
-                 marks=pytest.mark.skipif((3, 5, 0) <= sys.version_info[:3] <= (3, 5, 2),
+                 marks=pytest.mark.skipif(_SKIP_UNION_ERASURE,
                                           reason='Union erases the str on 3.5.0 -> 3.5.2')),
     (Optional[str],                 ':py:data:`~typing.Optional`\\[:py:class:`str`]'),
     (Callable,                      ':py:data:`~typing.Callable`'),
@@ -117,23 +149,26 @@ class Metaclass(type):
     (E[int],                        ':py:class:`~%s.E`\\[:py:class:`int`]' % __name__),
     (W,                             ':py:func:`~typing.NewType`\\(:py:data:`~W`, :py:class:`str`)')
 ])
-def test_format_annotation(inv, annotation, expected_result):
+
+
+@pytest.mark.parametrize('annotation, expected_result, fully_qualified_result, check_role',
+                         _FMT_CASES)
+def test_format_annotation(inv_roles, annotation, expected_result, fully_qualified_result,
+                           check_role):
     result = format_annotation(annotation)
     assert result == expected_result
 
     # Test with the "fully_qualified" flag turned on
-    if 'typing' in expected_result or __name__ in expected_result:
-        expected_result = expected_result.replace('~typing', 'typing')
-        expected_result = expected_result.replace('~' + __name__, __name__)
-        assert format_annotation(annotation, fully_qualified=True) == expected_result
+    if fully_qualified_result is not None:
+        assert format_annotation(annotation, fully_qualified=True) == fully_qualified_result
 
     # Test for the correct role (class vs data) using the official Sphinx inventory
-    if 'typing' in expected_result:
-        m = re.match('^:py:(?P<role>class|data|func):`~(?P<name>[^`]+)`', result)
+    if check_role:
+        m = _ROLE_RE.match(result)
         assert m, 'No match'
         name = m.group('name')
-        role = next((o.role for o in inv.objects if o.name == name), None)
-        if name in {'typing.Pattern', 'typing.Match', 'typing.NoReturn'}:
+        role = inv_roles.get(name)
+        if name in _OBJINV_SPECIAL:
             if sys.version_info < (3, 6):
                 assert role is None, 'No entry in Python 3.5’s objects.inv'
                 return
@@ -158,37 +193,7 @@ def test_process_docstring_slot_wrapper():
     assert not lines
 
 
-@pytest.mark.parametrize('always_document_param_types', [True, False])
-@pytest.mark.sphinx('text', testroot='dummy')
-def test_sphinx_output(app, status, warning, always_document_param_types):
-    test_path = pathlib.Path(__file__).parent
-
-    # Add test directory to sys.path to allow imports of dummy module.
-    if str(test_path) not in sys.path:
-        sys.path.insert(0, str(test_path))
-
-    app.config.always_document_param_types = always_document_param_types
-    app.build()
-
-    assert 'build succeeded' in status.getvalue()  # Build succeeded
-
-    # There should be a warning about an unresolved forward reference
-    warnings = warning.getvalue().strip()
-    assert 'Cannot resolve forward reference in type annotations of ' in warnings, warnings
-
-    if always_document_param_types:
-        undoc_params = '''
-
-           Parameters:
-              **x** ("int") --'''
-
-    else:
-        undoc_params = ""
-
-    text_path = pathlib.Path(app.srcdir) / '_build' / 'text' / 'index.txt'
-    with text_path.open('r') as f:
-        text_contents = f.read().replace('–', '--')
-        expected_contents = textwrap.dedent('''\
+_EXPECTED_TEMPLATE = textwrap.dedent('''\
         Dummy Module
         ************
 
@@ -436,16 +441,60 @@ def test_sphinx_output(app, status, warning, always_document_param_types):
            Class docstring.
 
            __init__()
-        '''.format(undoc_params=undoc_params)).replace('–', '--')
+        ''').translate(_DASH_TRANS)
 
-        if sys.version_info < (3, 6):
-            expected_contents += '''
+if sys.version_info < (3, 6):
+    _EXPECTED_TEMPLATE += '''
       Initialize self.  See help(type(self)) for accurate signature.
 '''
-        else:
-            expected_contents += '''
+else:
+    _EXPECTED_TEMPLATE += '''
       Return type:
          "None"
 '''
 
-        assert text_contents == expected_contents
+_EXPECTED_SPHINX_OUTPUT = {
+    True: _EXPECTED_TEMPLATE.format(undoc_params='''
+
+   Parameters:
+      **x** ("int") --'''),
+    False: _EXPECTED_TEMPLATE.format(undoc_params='')
+}
+
+
+@pytest.fixture(scope='module', params=[True, False])
+def built_app(request, rootdir, tmp_path_factory):
+    # Build the dummy project once per configuration and share it between tests
+    # Each configuration gets its own source directory so the builds can run in parallel.
+    # The project is nested one level down so remove_sphinx_projects() leaves it alone.
+    basedir = tmp_path_factory.mktemp('dummy-{}'.format(request.param))
+    srcdir = path(str(basedir)) / 'dummy'
+    (rootdir / 'test-dummy').copytree(srcdir)
+    status, warning = StringIO(), StringIO()
+    app = SphinxTestApp('text', srcdir=srcdir, freshenv=True, status=status, warning=warning)
+    try:
+        app.config.always_document_param_types = request.param
+        app.build()
+        yield app, status, warning, request.param
+    finally:
+        app.cleanup()
+
+
+def test_sphinx_output(built_app):
+    app, status, warning, always_document_param_types = built_app
+
+    assert 'build succeeded' in status.getvalue()  # Build succeeded
+
+    # There should be a warning about an unresolved forward reference
+    warnings = warning.getvalue()
+    assert 'Cannot resolve forward reference in type annotations of ' in warnings, warnings
+
+    text_path = pathlib.Path(app.srcdir) / '_build' / 'text' / 'index.txt'
+    text_contents = text_path.read_text(encoding='utf-8').translate(_DASH_TRANS)
+
+    expected_contents = _EXPECTED_SPHINX_OUTPUT[always_document_param_types]
+    if text_contents != expected_contents:
+        diff = difflib.unified_diff(expected_contents.splitlines(keepends=True),
+                                    text_contents.splitlines(keepends=True),
+                                    'expected', 'actual')
+        pytest.fail('Sphinx output does not match the expected contents:\n' + ''.join(diff))